@@ -1,5 +1,19 @@
 import heapq
-from collections import defaultdict
+from collections import Counter
+from itertools import accumulate
+
+INF = float('inf')
+LANDMARK_COUNT = 4  # Число ориентиров для эвристики ALT
+LANDMARK_MIN_QUERIES = 32  # Минимум разовых запросов, окупающий построение ориентиров
+HIERARCHY_MIN_QUERIES = 2048  # Минимум разовых запросов, окупающий сжатие графа
+HIERARCHY_WORK_LIMIT = 384  # Предел вершин, извлеченных поисками свидетелей, на город
+WITNESS_SETTLE_LIMIT = 64  # Предел вершин в одном поиске свидетеля при сжатии
+SSSP_CACHE_LIMIT = 500000  # Предел суммарного числа вершин в кэшированных деревьях
+# Минимум поисков из одного города по одному весу, при котором полное дерево
+# дешевле отдельных поисков: двунаправленных, A* с ориентирами и по иерархии сжатия
+TREE_MIN_QUERIES = 2
+LANDMARK_TREE_MIN_QUERIES = 6
+HIERARCHY_TREE_MIN_QUERIES = 16
 
 class RouteOptimization:
     """
@@ -9,16 +23,32 @@ class RouteOptimization:
     а также выбор компромиссного маршрута на основе заданных приоритетов.
     """
 
+    # Номера критериев в массивах весов графа и их названия для вывода
+    _WEIGHTS = {'Д': 0, 'В': 1, 'С': 2}
+    _NAMES = {'Д': 'ДЛИНА', 'В': 'ВРЕМЯ', 'С': 'СТОИМОСТЬ'}
+
     def __init__(self):
         """
         Инициализация системы оптимизации маршрутов.
         
         Создает необходимые структуры для хранения данных:
-        - _route_cache: кэш для хранения параметров маршрутов
+        - _route_cache: кэш параметров маршрутов по ключу поиска, который их построил
         - _road_index: индекс дорог для быстрого доступа к параметрам
+        - _edge_weights: веса ребер графа [длины, времена, стоимости, составные веса...]
+        - _parallel_roads: номера ребер для пар городов, соединенных несколькими дорогами
+        - _sssp_cache: деревья кратчайших путей по (start, weight_idx) до последнего запроса из start
+        - _landmarks: расстояния от ориентиров ALT по номеру составного веса
+        - _lex_weights: номера составных лексикографических весов по приоритетам
+        - _hierarchies: иерархии сжатия (contraction hierarchies) по номеру составного веса
         """
         self._route_cache = {}
-        self._road_index = defaultdict(dict)
+        self._road_index = {}
+        self._edge_weights = ([], [], [])
+        self._parallel_roads = {}
+        self._sssp_cache = {}
+        self._landmarks = {}
+        self._lex_weights = {}
+        self._hierarchies = {}
 
     def calculate(
             self,
@@ -36,55 +66,172 @@ class RouteOptimization:
         """
     
         try:
-            cities, roads, requests = self.parse_input(input_filename)
-            output_lines = []
-
-            city_to_id = {name: cid for cid, name in cities.items()}
-
-            for start_name, end_name, priorities in requests:
-                start_id = city_to_id[start_name]
-                end_id = city_to_id[end_name]
-
-                # Поиск оптимальных маршрутов по каждому критерию
-                optimal_routes = {}
-                weights = {'Д': 0, 'В': 1, 'С': 2}
-                names = {'Д': 'ДЛИНА', 'В': 'ВРЕМЯ', 'С': 'СТОИМОСТЬ'}
-
-                for crit, idx in weights.items():
-                    route, _ = self.dijkstra(roads, start_id, end_id, idx)
-                    optimal_routes[crit] = route
-
-                # Формирование вывода для каждого оптимального маршрута
-                for crit in ['Д', 'В', 'С']:
-                    route = optimal_routes[crit]
-                    if route:
-                        city_names = [cities[cid] for cid in route]
-                        length, time, cost = self.get_route_params(route)
-                        line = f"{names[crit]}: {' -> '.join(city_names)} | Д={length}, В={time}, С={cost}"
-                    else:
-                        line = f"{names[crit]}: Маршрут не найден"
-                    output_lines.append(line)
-
-                # Поиск компромиссного маршрута
-                compromise_route = self.find_compromise_route(roads, start_id, end_id, priorities)
-                if compromise_route:
-                    city_names = [cities[cid] for cid in compromise_route]
-                    length, time, cost = self.get_route_params(compromise_route)
-                    line = f"КОМПРОМИСС: {' -> '.join(city_names)} | Д={length}, В={time}, С={cost}"
-                else:
-                    line = "КОМПРОМИСС: Маршрут не найден"
-                output_lines.append(line)
-
-            # Запись результатов в файл
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(output_lines))
-        except Exception as e:
-            # По условию ничего не делаем
-            pass
+            # По условию при ошибках ввода-вывода и в формате данных ничего не делаем;
+            # ошибки самого расчета не скрываются
+            try:
+                cities, city_to_id, roads, requests = self.parse_input(input_filename)
+            except (OSError, ValueError, KeyError):
+                return
+
+            # Повторяющиеся запросы решаются один раз
+            request_counts = Counter(requests)
+
+            # Число поисков из каждого города по каждому составному весу; оно же
+            # служит обратным отсчетом, после которого дерево города удаляется
+            row_remaining = Counter()
+            for start_name, _, priorities in request_counts:
+                for idx in self.request_weights(roads, priorities):
+                    row_remaining[start_name, idx] += 1
+
+            # Поиски из городов, для которых полное дерево не окупится, идут
+            # по иерархии сжатия или двунаправленным A*, если их достаточно
+            # много, чтобы окупить предварительную обработку. Поиски считаются
+            # по порогу дерева, который будет действовать при этой обработке
+            hierarchy_queries = Counter()
+            landmark_queries = Counter()
+            for (_, idx), count in row_remaining.items():
+                if count < HIERARCHY_TREE_MIN_QUERIES:
+                    hierarchy_queries[idx] += count
+                if count < LANDMARK_TREE_MIN_QUERIES:
+                    landmark_queries[idx] += count
+            for idx, count in hierarchy_queries.most_common():
+                if count < HIERARCHY_MIN_QUERIES:
+                    break
+                hierarchy = self.build_hierarchy(roads, idx)
+                if hierarchy is None:
+                    # Плотность зависит только от топологии графа,
+                    # для других весов сжатие тоже не окупится
+                    break
+                self._hierarchies[idx] = hierarchy
+            for idx, count in landmark_queries.items():
+                if count >= LANDMARK_MIN_QUERIES and idx not in self._hierarchies:
+                    self._landmarks[idx] = self.build_landmarks(roads, idx)
+
+            # Результаты записываются в файл по мере расчета каждого запроса
+            try:
+                f = open(output_filename, 'w', encoding='utf-8')
+            except (OSError, ValueError):
+                return
+
+            with f:
+                separator = ''
+                # Готовый вывод повторяющихся запросов хранится
+                # только до их последнего вхождения
+                solved = {}
+                for request in requests:
+                    block = solved.get(request)
+                    if block is None:
+                        start_name, end_name, priorities = request
+                        start_id = city_to_id[start_name]
+                        weights = self.request_weights(roads, priorities)
+
+                        # Полное дерево строится, если оставшихся поисков из города
+                        # по весу не меньше, чем окупает доступный быстрый поиск
+                        tree_weights = {
+                            idx for idx in weights
+                            if row_remaining[start_name, idx] >= self.tree_min_queries(idx)
+                        }
+                        block = self.solve_request(
+                            roads, cities, start_id, city_to_id[end_name], priorities, tree_weights
+                        )
+                        if request_counts[request] > 1:
+                            solved[request] = block
+
+                        # После последнего поиска из города по весу дерево не нужно
+                        for idx in weights:
+                            row_remaining[start_name, idx] -= 1
+                            if not row_remaining[start_name, idx]:
+                                del row_remaining[start_name, idx]
+                                self._sssp_cache.pop((start_id, idx), None)
+
+                    f.write(separator)
+                    f.write(block)
+                    separator = '\n'
+
+                    request_counts[request] -= 1
+                    if not request_counts[request]:
+                        solved.pop(request, None)
         finally:
             # Очистка состояния
             self._route_cache.clear()
             self._road_index.clear()
+            self._edge_weights = ([], [], [])
+            self._parallel_roads.clear()
+            self._sssp_cache.clear()
+            self._landmarks.clear()
+            self._lex_weights.clear()
+            self._hierarchies.clear()
+
+    def solve_request(
+            self,
+            graph: tuple, # Граф дорог в формате CSR
+            cities: dict, # Словарь городов {номер: название}
+            start_id: int,
+            end_id: int,
+            priorities: tuple,
+            tree_weights: set = frozenset() # Номера весов, по которым строятся полные деревья
+        ) -> str:
+        """
+        Поиск маршрутов для одного запроса.
+
+        Возвращает вывод запроса: оптимальные маршруты по каждому
+        критерию и компромиссный маршрут
+        """
+        request_lines = []
+        routes = {}  # Найденные маршруты по номеру составного веса
+        for crit in self._WEIGHTS:
+            # Равенство по критерию разрешается остальными в фиксированном порядке:
+            # так любой способ поиска выбирает маршрут с одними и теми же параметрами
+            idx = self.lex_weight_idx(graph, (crit,))
+            routes[idx], _ = self.dijkstra(graph, start_id, end_id, idx, idx in tree_weights)
+            request_lines.append(self.format_route(
+                self._NAMES[crit], routes[idx], cities, (start_id, end_id, idx)
+            ))
+
+        # Поиск компромиссного маршрута; если порядок приоритетов
+        # совпадает с порядком одного из критериев, маршрут уже найден
+        compromise_idx = self.lex_weight_idx(graph, priorities)
+        if compromise_idx in routes:
+            compromise_route = routes[compromise_idx]
+        else:
+            compromise_route = self.find_compromise_route(
+                graph, start_id, end_id, priorities, compromise_idx in tree_weights
+            )
+        request_lines.append(self.format_route(
+            'КОМПРОМИСС', compromise_route, cities, (start_id, end_id, compromise_idx)
+        ))
+
+        return '\n'.join(request_lines)
+
+    def request_weights(
+            self,
+            graph: tuple, # Граф дорог в формате CSR
+            priorities: tuple # Приоритеты запроса
+        ) -> list[int]:
+        """
+        Номера составных весов, по которым ищутся маршруты одного запроса:
+        по одному на критерий и вес компромисса, если его порядок
+        не совпал ни с одним из критериев
+        """
+        weights = [self.lex_weight_idx(graph, (crit,)) for crit in self._WEIGHTS]
+        compromise_idx = self.lex_weight_idx(graph, priorities)
+        if compromise_idx not in weights:
+            weights.append(compromise_idx)
+        return weights
+
+    def tree_min_queries(
+            self,
+            weight_idx: int # Номер составного веса
+        ) -> int:
+        """
+        Число поисков из одного города, начиная с которого полное дерево
+        кратчайших путей дешевле отдельных поисков по этому весу
+        """
+        if weight_idx in self._hierarchies:
+            return HIERARCHY_TREE_MIN_QUERIES
+        if weight_idx in self._landmarks:
+            return LANDMARK_TREE_MIN_QUERIES
+        return TREE_MIN_QUERIES
 
     def parse_input(
             self,
@@ -94,119 +241,589 @@ class RouteOptimization:
         Парсинг входных данных из файла.
 
         Возвращает кортеж с разбором данных:
-        - cities: словарь городов {id: название}
-        - roads: граф дорог
+        - cities: словарь городов {номер: название}
+        - city_to_id: обратный словарь {название: номер}
+        - roads: граф дорог в формате CSR (см. build_csr)
         - requests: список запросов на построение маршрутов
         """
         cities = {}
-        roads = defaultdict(list)
+        city_to_id = {}
+        edges = []
         requests = []
 
-        with open(input_filename, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # ID из файла - произвольные натуральные числа, поэтому каждому
+        # городу выдается плотный номер 0..k-1, которым индексируются массивы
+        dense = {}
+
+        def dense_id(cid):
+            return dense.setdefault(cid, len(dense))
+
+        # Файл читается целиком в байтах; строки декодируются только там,
+        # где нужны названия городов, а числа разбираются прямо из байтов
+        with open(input_filename, 'rb') as f:
+            data = f.read()
 
         section = None
-        for line in lines:
+        for line in data.splitlines():
             line = line.strip()
             if not line:
                 continue
 
-            if line == '[CITIES]':
-                section = 'cities'
-                continue
-            elif line == '[ROADS]':
-                section = 'roads'
-                continue
-            elif line == '[REQUESTS]':
-                section = 'requests'
-                continue
-
-            if section == 'cities':
-                cid, name = line.split(': ', 1)
-                cities[int(cid)] = name.strip()
-            elif section == 'roads':
-                parts = line.split(': ')
-                cities_part = parts[0].strip()
-                params_part = parts[1].strip()
-
-                cid1, cid2 = map(int, cities_part.split(' - '))
-                length, time, cost = map(int, params_part.split(', '))
+            if line[:1] == b'[':
+                if line == b'[CITIES]':
+                    section = 'cities'
+                    continue
+                elif line == b'[ROADS]':
+                    section = 'roads'
+                    continue
+                elif line == b'[REQUESTS]':
+                    section = 'requests'
+                    continue
 
-                roads[cid1].append((cid2, length, time, cost))
-                roads[cid2].append((cid1, length, time, cost))
+            if section == 'roads':
+                # "ID1 - ID2: длина, время, стоимость" -> пять чисел через запятую
+                fields = line.replace(b' - ', b',').replace(b': ', b',').replace(b', ', b',')
+                cid1, cid2, length, time, cost = map(int, fields.split(b','))
+
+                edges.append((dense_id(cid1), dense_id(cid2), length, time, cost))
+            elif section == 'cities':
+                cid, name = line.split(b': ', 1)
+                cid = dense_id(int(cid))
+                name = name.strip().decode('utf-8')
+                cities[cid] = name
+                city_to_id[name] = cid
             elif section == 'requests':
-                route_part, priority_part = line.split(' | ')
+                route_part, priority_part = line.decode('utf-8').split(' | ')
                 start, end = route_part.split(' -> ')
-                priorities = priority_part[1:-1].split(',')
+                priorities = tuple(priority_part[1:-1].split(','))
 
                 requests.append((start, end, priorities))
 
+        # Дороги и запросы проверяются здесь, чтобы ошибки во входных данных
+        # не всплывали посреди расчета
+        if len(dense) != len(cities):
+            unknown = next(cid for cid, num in dense.items() if num not in cities)
+            raise ValueError(f"Город с ID {unknown} не найден")
+        for start, end, priorities in requests:
+            for name in (start, end):
+                if name not in city_to_id:
+                    raise ValueError(f"Город {name} не найден")
+            for crit in priorities:
+                if crit not in self._WEIGHTS:
+                    raise ValueError(f"Неизвестный критерий {crit}")
+
+        roads = self.build_csr(edges, len(dense))
         self.build_road_index(roads)
 
-        return cities, roads, requests
+        return cities, city_to_id, roads, requests
+
+    def build_csr(
+            self,
+            edges: list, # Список дорог (номер1, номер2, длина, время, стоимость)
+            n: int # Число вершин
+        ) -> tuple:
+        """
+        Построение графа дорог в формате CSR.
+
+        Возвращает кортеж плоских массивов:
+        - indptr: соседи вершины u лежат в позициях indptr[u]..indptr[u + 1]
+        - indices: номера соседей
+        - weights: веса ребер по каждому критерию [длина, время, стоимость]
+        """
+        degree = [0] * (n + 1)
+        for cid1, cid2, _, _, _ in edges:
+            degree[cid1 + 1] += 1
+            degree[cid2 + 1] += 1
+
+        indptr = list(accumulate(degree))
+        size = indptr[n]
+        indices = [0] * size
+        weights = [[0] * size for _ in range(3)]
+        lengths, times, costs = weights
+
+        # Дороги двусторонние: каждая дает по ребру в обе стороны
+        cursor = indptr[:n]
+        for cid1, cid2, length, time, cost in edges:
+            for u, v in ((cid1, cid2), (cid2, cid1)):
+                k = cursor[u]
+                cursor[u] = k + 1
+                indices[k] = v
+                lengths[k] = length
+                times[k] = time
+                costs[k] = cost
+
+        return indptr, indices, weights
 
     def build_road_index(
             self,
-            graph: dict # Граф дорог для построения индекса
+            graph: tuple # Граф дорог в формате CSR для построения индекса
         ):
         """
         Создает индекс дорог для быстрого доступа к параметрам.
 
-        Преобразует граф дорог в структуру, позволяющую получать параметры маршрута за O(1)
+        Преобразует граф дорог в плоский словарь {(номер1, номер2): номер ребра в CSR},
+        позволяющий найти дорогу одним обращением за O(1). Сами параметры
+        берутся из массивов весов графа по номеру ребра.
+        Если города соединены несколькими дорогами, все их ребра
+        дополнительно запоминаются в _parallel_roads
         """
-        self._road_index = defaultdict(dict)
-        for city in graph:
-            for neighbor, length, time, cost in graph[city]:
-                self._road_index[city][neighbor] = (length, time, cost)
+        indptr, indices, weights = graph
+        self._road_index = {
+            (city, indices[k]): k
+            for city in range(len(indptr) - 1)
+            for k in range(indptr[city], indptr[city + 1])
+        }
+        # Массивы весов не копируются: составные веса добавляются в граф позже
+        self._edge_weights = weights
+
+        if len(self._road_index) < len(indices):
+            for city in range(len(indptr) - 1):
+                for k in range(indptr[city], indptr[city + 1]):
+                    pair = (city, indices[k])
+                    indexed = self._road_index[pair]
+                    if indexed != k:
+                        self._parallel_roads.setdefault(pair, [indexed]).append(k)
 
     def dijkstra(
         self, 
-        graph: dict, 
+        graph: tuple, 
         start: int, 
         end: int, 
+        weight_idx: int,
+        full_tree: bool = False
+    ) -> tuple[list[int], int]:
+        """
+        Поиск кратчайшего пути между двумя городами по заданному критерию
+
+        Если дерево кратчайших путей из start уже построено или запрошено
+        через full_tree, путь восстанавливается по нему. Иначе выполняется
+        поиск только для пары (start, end): по иерархии сжатия, если она
+        построена для критерия, или двунаправленный поиск по графу
+        """
+        key = (start, weight_idx)
+        if key not in self._sssp_cache:
+            if not full_tree:
+                if weight_idx in self._hierarchies:
+                    return self._hierarchy_query(start, end, weight_idx)
+                return self._bidirectional(graph, start, end, weight_idx)
+            # Деревья живут до последнего запроса из своего города; если запросы
+            # многих городов перемешаны, самые старые деревья вытесняются
+            if len(self._sssp_cache) >= max(SSSP_CACHE_LIMIT // len(graph[0]), 1):
+                del self._sssp_cache[next(iter(self._sssp_cache))]
+            self._sssp_cache[key] = self._sssp(graph, start, weight_idx)
+
+        parent, distance = self._sssp_cache[key]
+        if distance[end] == INF:
+            return None, None
+        return self.reconstruct(parent, end), distance[end]
+
+    def _bidirectional(
+        self,
+        graph: tuple, # Граф дорог в формате CSR
+        start: int,
+        end: int,
         weight_idx: int
     ) -> tuple[list[int], int]:
         """
-        Оптимизированная версия алгоритма Дейкстры с использованием родительских указателей
+        Двунаправленный алгоритм Дейкстры
+
+        Поиск ведется одновременно от start и от end и останавливается,
+        когда сумма минимальных ключей двух очередей достигает длины
+        лучшего найденного пути через точку встречи. Дороги двусторонние,
+        поэтому обратный поиск использует тот же граф.
+
+        Если для критерия построены ориентиры, поиск превращается
+        в двунаправленный A*: ключи сдвигаются на усредненный потенциал
+        p(v) = (h_end(v) - h_start(v)) / 2, где h - нижние оценки ALT
         """
-        pq = [(0, start)]
-        visited = set()
-        parent = {}  # Словарь для хранения родительских вершин
-        distance = {start: 0}  # Словарь для хранения расстояний
+        if start == end:
+            return [start], 0
+
+        indptr, indices, weights = graph
+        w_row = weights[weight_idx]
+        n = len(indptr) - 1
+
+        # Ключи хранятся удвоенными, чтобы потенциал оставался целым:
+        # 2 * dist_f + pot для прямого поиска и 2 * dist_b - pot для обратного
+        landmarks = self._landmarks.get(weight_idx)
+        if landmarks:
+            pot = [None] * n
+            bounds = [
+                (dist, dist[end], dist[start]) for dist in landmarks
+                if dist[end] != INF and dist[start] != INF
+            ]
 
-        while pq:
-            current_weight, current_node = heapq.heappop(pq)
+            def potential(node):
+                h_end = h_start = 0
+                for dist, to_end, to_start in bounds:
+                    d = dist[node]
+                    h = d - to_end if d > to_end else to_end - d
+                    if h > h_end:
+                        h_end = h
+                    h = d - to_start if d > to_start else to_start - d
+                    if h > h_start:
+                        h_start = h
+                pot[node] = h_end - h_start
+                return pot[node]
+        else:
+            pot = [0] * n
+
+        dist_f = [INF] * n
+        dist_b = [INF] * n
+        parent_f = [-1] * n
+        parent_b = [-1] * n
+        dist_f[start] = 0
+        dist_b[end] = 0
+        if landmarks:
+            potential(start)
+            potential(end)
+        pq_f = [pot[start] * n + start]
+        pq_b = [-pot[end] * n + end]
+
+        best = INF  # Длина лучшего найденного пути
+        meet = -1  # Вершина, в которой встретились поиски
+
+        while pq_f and pq_b:
+            if pq_f[0] // n + pq_b[0] // n >= 2 * best:
+                break
+
+            # Расширяем ту сторону, у которой меньше очередь
+            if len(pq_f) <= len(pq_b):
+                pq, distance, parent, other, sign = pq_f, dist_f, parent_f, dist_b, 1
+            else:
+                pq, distance, parent, other, sign = pq_b, dist_b, parent_b, dist_f, -1
 
-            if current_node in visited:
+            current_key, current_node = divmod(heapq.heappop(pq), n)
+            current_weight = distance[current_node]
+            if current_key > 2 * current_weight + sign * pot[current_node]:
                 continue
 
-            visited.add(current_node)
+            lo = indptr[current_node]
+            hi = indptr[current_node + 1]
+            for neighbor, weight in zip(indices[lo:hi], w_row[lo:hi]):
+                new_dist = current_weight + weight
+
+                if new_dist < distance[neighbor]:
+                    distance[neighbor] = new_dist
+                    parent[neighbor] = current_node
+                    p = pot[neighbor]
+                    if p is None:
+                        p = potential(neighbor)
+                    heapq.heappush(pq, (2 * new_dist + sign * p) * n + neighbor)
+
+                    total = new_dist + other[neighbor]
+                    if total < best:
+                        best = total
+                        meet = neighbor
+
+        if meet == -1:
+            return None, None
+
+        # Склеиваем прямой путь до точки встречи и обратный путь от нее
+        path = self.reconstruct(parent_f, meet)
+        current_node = parent_b[meet]
+        while current_node != -1:
+            path.append(current_node)
+            current_node = parent_b[current_node]
+        return path, best
+
+    def build_landmarks(
+            self,
+            graph: tuple, # Граф дорог в формате CSR
+            weight_idx: int # Критерий, по которому считаются расстояния
+        ) -> list[list[int]]:
+        """
+        Выбор ориентиров для эвристики ALT (A*, ориентиры, неравенство треугольника).
+
+        Ориентиры выбираются жадно: каждый следующий - вершина, наиболее
+        удаленная от уже выбранных. Возвращает массивы расстояний от каждого
+        ориентира; |d(L, v) - d(L, t)| - нижняя оценка расстояния от v до t
+        """
+        indptr = graph[0]
+        nodes = [v for v in range(len(indptr) - 1) if indptr[v + 1] > indptr[v]]
+        if not nodes:
+            return []
+
+        # Расстояние до ближайшего ориентира; недостижимые вершины
+        # выбираются первыми, чтобы покрыть все компоненты связности
+        _, nearest = self._sssp(graph, nodes[0], weight_idx)
+        landmarks = []
+        for _ in range(LANDMARK_COUNT):
+            landmark = max(nodes, key=nearest.__getitem__)
+            if nearest[landmark] == 0:
+                break
+            _, distance = self._sssp(graph, landmark, weight_idx)
+            landmarks.append(distance)
+            nearest = list(map(min, nearest, distance))
+
+        return landmarks
+
+    def build_hierarchy(
+            self,
+            graph: tuple, # Граф дорог в формате CSR
+            weight_idx: int # Критерий, по которому сжимается граф
+        ) -> tuple[list, dict] | None:
+        """
+        Построение иерархии сжатия (contraction hierarchies).
+
+        Вершины удаляются по одной в порядке важности (разность ребер:
+        число нужных шорткатов минус степень вершины). При удалении вершины v
+        между ее соседями u и x добавляется шорткат u - x, если без v
+        не найден путь не длиннее u - v - x.
 
-            if current_node == end:
-                # Восстанавливаем путь из родительских указателей
-                path = []
-                while current_node is not None:
-                    path.append(current_node)
-                    current_node = parent.get(current_node)
-                return path[::-1], current_weight
+        Возвращает кортеж:
+        - up: ребра каждой вершины к соседям, сжатым позже нее [(сосед, вес)]
+        - middle: промежуточная вершина каждого шортката {(u, x): v}
 
-            for neighbor, length, time, cost in graph[current_node]:
-                if neighbor in visited:
+        На дорожных сетях поиски свидетелей короткие. Если же их суммарная
+        работа превышает HIERARCHY_WORK_LIMIT на город (а для начальной
+        оценки важности - четверть этого предела), граф слишком плотный
+        для сжатия: построение прерывается и возвращается None
+        """
+        indptr, indices, weights = graph
+        w_row = weights[weight_idx]
+        n = len(indptr) - 1
+
+        # Рабочий граф: словари смежности без петель, из параллельных дорог
+        # остается кратчайшая
+        adj = [{} for _ in range(n)]
+        for u in range(n):
+            neighbors = adj[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                if v != u and w_row[k] < neighbors.get(v, INF):
+                    neighbors[v] = w_row[k]
+
+        budget = HIERARCHY_WORK_LIMIT * sum(
+            1 for u in range(n) if indptr[u + 1] > indptr[u]
+        )
+        initial_budget = budget * 3 // 4
+
+        def witness(source, avoid, limit, targets):
+            # Ограниченный поиск Дейкстры от source в обход avoid до всех targets;
+            # найденные расстояния - длины реальных путей, поэтому неполный
+            # поиск приводит только к лишним шорткатам, но не к ошибкам
+            nonlocal budget
+            distance = {source: 0}
+            pq = [source]
+            settled = 0
+            remaining = len(targets)
+            while pq and settled < WITNESS_SETTLE_LIMIT:
+                current_weight, current_node = divmod(heapq.heappop(pq), n)
+                if current_weight > distance[current_node]:
                     continue
-                    
-                weight = [length, time, cost][weight_idx]
+                settled += 1
+                if current_node in targets:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                for neighbor, weight in adj[current_node].items():
+                    new_dist = current_weight + weight
+                    if (neighbor != avoid and new_dist <= limit
+                            and new_dist < distance.get(neighbor, INF)):
+                        distance[neighbor] = new_dist
+                        heapq.heappush(pq, new_dist * n + neighbor)
+            budget -= settled
+            return distance
+
+        def shortcuts(v):
+            items = list(adj[v].items())
+            result = []
+            for i, (u, weight_u) in enumerate(items):
+                targets = {x: weight_u + weight_x for x, weight_x in items[i + 1:]}
+                if not targets:
+                    break
+                distance = witness(u, v, max(targets.values()), targets)
+                for x, cost in targets.items():
+                    if distance.get(x, INF) > cost:
+                        result.append((u, x, cost))
+            return result
+
+        # Важность: удвоенная разность ребер плюс число удаленных соседей,
+        # чтобы сжатие шло по графу равномерно
+        removed = [0] * n
+        pq = []
+        for v in range(n):
+            pq.append((2 * (len(shortcuts(v)) - len(adj[v])), v))
+            if budget < initial_budget:
+                return None
+        heapq.heapify(pq)
+
+        up = [None] * n
+        middle = {}
+        while pq:
+            if budget < 0:
+                return None
+
+            _, v = heapq.heappop(pq)
+
+            # Ленивое обновление: важность пересчитывается при извлечении
+            needed = shortcuts(v)
+            priority = 2 * (len(needed) - len(adj[v])) + removed[v]
+            if pq and priority > pq[0][0]:
+                heapq.heappush(pq, (priority, v))
+                continue
+
+            up[v] = list(adj[v].items())
+            for u in adj[v]:
+                del adj[u][v]
+                removed[u] += 1
+            for u, x, cost in needed:
+                if cost < adj[u].get(x, INF):
+                    adj[u][x] = adj[x][u] = cost
+                    middle[u, x] = middle[x, u] = v
+            adj[v] = None
+
+        return up, middle
+
+    def _hierarchy_query(
+        self,
+        start: int,
+        end: int,
+        weight_idx: int
+    ) -> tuple[list[int], int]:
+        """
+        Поиск пути по иерархии сжатия
+
+        Два поиска Дейкстры от start и от end идут только по ребрам к более
+        поздно сжатым вершинам и встречаются в самой поздней вершине пути.
+        Затем шорткаты пути раскрываются в исходные дороги
+        """
+        if start == end:
+            return [start], 0
+
+        up, middle = self._hierarchies[weight_idx]
+        n = len(up)
+
+        dist_f = {start: 0}
+        dist_b = {end: 0}
+        parent_f = {start: -1}
+        parent_b = {end: -1}
+        pq_f = [start]
+        pq_b = [end]
+
+        best = INF  # Длина лучшего найденного пути
+        meet = -1  # Вершина, в которой встретились поиски
+
+        while pq_f or pq_b:
+            # Расширяем сторону с меньшим ключом
+            if pq_f and (not pq_b or pq_f[0] <= pq_b[0]):
+                pq, distance, parent, other = pq_f, dist_f, parent_f, dist_b
+            else:
+                pq, distance, parent, other = pq_b, dist_b, parent_b, dist_f
+
+            current_weight, current_node = divmod(heapq.heappop(pq), n)
+            if current_weight >= best:
+                # Оставшиеся вершины этой стороны не улучшат путь
+                pq.clear()
+                continue
+            if current_weight > distance[current_node]:
+                continue
+
+            total = current_weight + other.get(current_node, INF)
+            if total < best:
+                best = total
+                meet = current_node
+
+            for neighbor, weight in up[current_node]:
+                new_dist = current_weight + weight
+                if new_dist < distance.get(neighbor, INF):
+                    distance[neighbor] = new_dist
+                    parent[neighbor] = current_node
+                    heapq.heappush(pq, new_dist * n + neighbor)
+
+        if meet == -1:
+            return None, None
+
+        # Путь по иерархии: от start до точки встречи и от нее до end
+        path = []
+        current_node = meet
+        while current_node != -1:
+            path.append(current_node)
+            current_node = parent_f[current_node]
+        path.reverse()
+        current_node = parent_b[meet]
+        while current_node != -1:
+            path.append(current_node)
+            current_node = parent_b[current_node]
+
+        # Раскрытие шорткатов в исходные дороги
+        route = [start]
+        for u, x in zip(path, path[1:]):
+            stack = [(u, x)]
+            while stack:
+                a, b = stack.pop()
+                v = middle.get((a, b))
+                if v is None:
+                    route.append(b)
+                else:
+                    stack.append((v, b))
+                    stack.append((a, v))
+        return route, best
+
+    def _sssp(
+        self,
+        graph: tuple, # Граф дорог в формате CSR
+        start: int,
+        weight_idx: int
+    ) -> tuple[list[int], list[int]]:
+        """
+        Алгоритм Дейкстры от одной вершины до всех остальных
+
+        Возвращает массивы родительских указателей и расстояний,
+        индексированные по номеру города
+        """
+        indptr, indices, weights = graph
+        w_row = weights[weight_idx]
+
+        # Элементы очереди - целые числа weight * n + node вместо кортежей:
+        # порядок тот же, что у (weight, node), но без выделения кортежа
+        # Очередь остается на heapq: бинарная куча на C быстрее 4-арной,
+        # написанной на Python, несмотря на меньшую глубину
+        n = len(indptr) - 1
+        pq = [start]
+        parent = [-1] * n  # Родительские вершины, -1 - нет родителя
+        distance = [INF] * n  # Расстояния от start
+        distance[start] = 0
+
+        while pq:
+            current_weight, current_node = divmod(heapq.heappop(pq), n)
+
+            # Устаревшая запись: вершина уже извлечена с меньшим весом
+            if current_weight > distance[current_node]:
+                continue
+
+            lo = indptr[current_node]
+            hi = indptr[current_node + 1]
+            for neighbor, weight in zip(indices[lo:hi], w_row[lo:hi]):
                 new_dist = current_weight + weight
-                
-                if neighbor not in distance or new_dist < distance[neighbor]:
+
+                if new_dist < distance[neighbor]:
                     distance[neighbor] = new_dist
                     parent[neighbor] = current_node
-                    heapq.heappush(pq, (new_dist, neighbor))
+                    heapq.heappush(pq, new_dist * n + neighbor)
+
+        return parent, distance
 
-        return None, None
+    def reconstruct(
+            self,
+            parent: list, # Родительские указатели дерева кратчайших путей
+            end: int # Конечная вершина
+        ) -> list[int]:
+        """
+        Восстанавливает путь из родительских указателей за O(длины пути)
+        """
+        path = []
+        current_node = end
+        while current_node != -1:
+            path.append(current_node)
+            current_node = parent[current_node]
+        return path[::-1]
 
     def get_route_params(
             self,
-            route: list # Маршрут в виде списка ID городов
+            route: list, # Маршрут в виде списка номеров городов
+            route_key: tuple # Ключ поиска, построившего маршрут: (start, end, номер веса)
         ) -> tuple[int, int, int]:
         """
         Получение параметров маршрута.
@@ -215,91 +832,112 @@ class RouteOptimization:
         - общая длина
         - общее время
         - общая стоимость
+
+        Кэш использует ключ поиска, а не сам маршрут: один и тот же поиск
+        всегда дает один и тот же маршрут, а хэшировать ключ дешевле,
+        чем кортеж из всех городов маршрута
         """
-        route_key = tuple(route)
-        
         if route_key in self._route_cache:
             return self._route_cache[route_key]
         
-        total_length = 0
-        total_time = 0
-        total_cost = 0
-        
-        # Используем созданный индекс для быстрого доступа
-        for i in range(len(route) - 1):
-            start = route[i]
-            end = route[i + 1]
-            
-            # Получаем параметры за O(1)
-            params = self._road_index[start].get(end)
-            if params:
-                length, time, cost = params
-                total_length += length
-                total_time += time
-                total_cost += cost
-            else:
-                raise ValueError(f"Дорога между {start} и {end} не найдена")
-        
+        # Номера ребер маршрута, затем суммы по каждому массиву параметров
+        try:
+            edge_ids = [self._road_index[pair] for pair in zip(route, route[1:])]
+        except KeyError as e:
+            start, end = e.args[0]
+            raise ValueError(f"Дорога между {start} и {end} не найдена") from None
+
+        # Из параллельных дорог поиск проходит по самой легкой в своем весе
+        if self._parallel_roads:
+            row = self._edge_weights[route_key[2]]
+            for i, pair in enumerate(zip(route, route[1:])):
+                ids = self._parallel_roads.get(pair)
+                if ids:
+                    edge_ids[i] = min(ids, key=row.__getitem__)
+
+        lengths, times, costs = self._edge_weights[:3]
+        total_length = sum(map(lengths.__getitem__, edge_ids))
+        total_time = sum(map(times.__getitem__, edge_ids))
+        total_cost = sum(map(costs.__getitem__, edge_ids))
+
         self._route_cache[route_key] = (total_length, total_time, total_cost)
         return total_length, total_time, total_cost
 
+    def format_route(
+            self,
+            title: str, # Название маршрута в выводе
+            route: list, # Маршрут в виде списка номеров городов или None
+            cities: dict, # Словарь городов {id: название}
+            route_key: tuple # Ключ поиска, построившего маршрут
+        ) -> str:
+        """
+        Формирует строку вывода для маршрута.
+        """
+        if not route:
+            return f"{title}: Маршрут не найден"
+
+        length, time, cost = self.get_route_params(route, route_key)
+        city_names = ' -> '.join([cities[cid] for cid in route])
+        return f"{title}: {city_names} | Д={length}, В={time}, С={cost}"
+
     def find_compromise_route(
             self,
-            graph: dict,
+            graph: tuple, # Граф дорог в формате CSR
             start_id: int,
             end_id: int,
-            priorities: list
+            priorities: tuple,
+            full_tree: bool = False
         ):
         """
         Поиск компромиссного маршрута между городами.
         
-        Возвращает оптимальный маршрут, учитывающий заданные приоритеты.
+        Возвращает маршрут, лексикографически оптимальный по критериям
+        в порядке приоритетов: минимальный по первому критерию, среди таких -
+        по второму и т.д. Находится одним поиском по составному весу.
+        Не указанные в приоритетах критерии идут последними (см. lex_weight_idx).
         Если маршрут не найден, возвращает None.
         """
+        weight_idx = self.lex_weight_idx(graph, priorities)
+        route, _ = self.dijkstra(graph, start_id, end_id, weight_idx, full_tree)
+        return route
 
-        # Поиск оптимальных маршрутов по каждому критерию
-        routes = {}
-        weights = {'Д': 0, 'В': 1, 'С': 2}
-        
-        for crit, idx in weights.items():
-            route, _ = self.dijkstra(graph, start_id, end_id, idx)
-            routes[crit] = route
+    def lex_weight_idx(
+            self,
+            graph: tuple, # Граф дорог в формате CSR
+            priorities: tuple # Критерии в порядке убывания важности
+        ) -> int:
+        """
+        Номер составного веса для заданного порядка приоритетов.
+
+        Веса ребер по критериям сворачиваются в одно целое число
+        w = (w1 * B2 + w2) * B3 + w3, где Bi больше суммы любого пути
+        по i-му критерию. Сравнение сумм таких весов совпадает
+        с лексикографическим сравнением кортежей (w1, w2, w3).
+        Критерии, которых нет в priorities, дописываются в конец в порядке
+        _WEIGHTS, чтобы равенство по всем заданным критериям разрешалось
+        одинаково при любом способе поиска.
+        Строка весов добавляется в граф один раз для каждого порядка
+        """
+        order = tuple(priorities) + tuple(
+            crit for crit in self._WEIGHTS if crit not in priorities
+        )
+        if order in self._lex_weights:
+            return self._lex_weights[order]
 
-        # Сбор уникальных маршрутов с кешированными параметрами
-        candidate_routes = []
-        seen = set()
-        
-        for crit in weights.keys():
-            route = routes[crit]
-            if route is None:
-                continue
-            route_tuple = tuple(route)
-            if route_tuple not in seen:
-                seen.add(route_tuple)
-                # get_route_params использует кеш
-                length, time, cost = self.get_route_params(route)
-                candidate_routes.append({
-                    'route': route,
-                    'Д': length,
-                    'В': time,
-                    'С': cost
-                })
-
-        if not candidate_routes:
-            return None
-
-        # Последовательная фильтрация по приоритетам
-        for crit in priorities:
-            if not candidate_routes:
-                break
-            min_value = min(route[crit] for route in candidate_routes)
-            candidate_routes = [
-                route for route in candidate_routes 
-                if route[crit] == min_value
-            ]
+        weights = graph[2]
+
+        lex_row = [0] * len(weights[0])
+        for crit in order:
+            row = weights[self._WEIGHTS[crit]]
+            # Каждая дорога хранится в обе стороны, а путь проходит ее не более раза
+            base = sum(row) // 2 + 1
+            lex_row = [lex * base + w for lex, w in zip(lex_row, row)]
 
-        return candidate_routes[0]['route'] if candidate_routes else None
+        weights.append(lex_row)
+        self._lex_weights[order] = len(weights) - 1
+        return self._lex_weights[order]
 
 # Запуск
-route_optimization = RouteOptimization()
-route_optimization.calculate('input.txt', 'output.txt')
+if __name__ == '__main__':
+    route_optimization = RouteOptimization()
+    route_optimization.calculate('input.txt', 'output.txt')
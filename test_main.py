@@ -0,0 +1,226 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+
+
+def random_graph(seed: int) -> str:
+    """
+    Случайный граф с параллельными дорогами, петлей и отдельной
+    компонентой связности из трех городов; ID городов разреженные
+    """
+    rnd = random.Random(seed)
+    n = 24
+    lines = ['[CITIES]'] + [f'{i * 1000 + 7}: Город {i}' for i in range(n + 3)]
+    lines.append('[ROADS]')
+    for _ in range(3 * n):
+        a, b = rnd.sample(range(n), 2)
+        lines.append(f'{a * 1000 + 7} - {b * 1000 + 7}: '
+                     f'{rnd.randint(1, 9)}, {rnd.randint(1, 9)}, {rnd.randint(1, 9)}')
+    # Параллельная дорога к уже существующей и петля
+    lines.append(lines[-1].split(':')[0] + ': 1, 9, 5')
+    lines.append('7 - 7: 1, 1, 1')
+    # Отдельная компонента
+    for a, b in ((n, n + 1), (n + 1, n + 2)):
+        lines.append(f'{a * 1000 + 7} - {b * 1000 + 7}: 3, 2, 1')
+    return '\n'.join(lines)
+
+
+def grid_graph(seed: int, width: int = 8) -> str:
+    """
+    Решетка width x width, на которой иерархия сжатия строится полностью
+    """
+    rnd = random.Random(seed)
+    lines = ['[CITIES]'] + [f'{i + 1}: Узел {i}' for i in range(width * width)]
+    lines.append('[ROADS]')
+    for y in range(width):
+        for x in range(width):
+            for dx, dy in ((1, 0), (0, 1)):
+                if x + dx < width and y + dy < width:
+                    lines.append(f'{y * width + x + 1} - {(y + dy) * width + x + dx + 1}: '
+                                 f'{rnd.randint(1, 20)}, {rnd.randint(1, 20)}, {rnd.randint(1, 20)}')
+    return '\n'.join(lines)
+
+
+class TempDirTest(unittest.TestCase):
+    """
+    Тесты с входными и выходными файлами во временном каталоге
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def calculate(self, text: str) -> list[str] | None:
+        """
+        Запускает расчет и возвращает строки вывода или None, если файл не создан
+        """
+        input_path = self.write('input.txt', text)
+        output_path = os.path.join(self.tmp.name, 'output.txt')
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        main.RouteOptimization().calculate(input_path, output_path)
+        if not os.path.exists(output_path):
+            return None
+        with open(output_path, encoding='utf-8') as f:
+            return f.read().split('\n')
+
+
+class SearchTest(TempDirTest):
+    """
+    Сверка двунаправленного поиска, ALT и иерархии сжатия
+    с полным деревом кратчайших путей
+    """
+
+    def check_searches(self, text: str):
+        optimizer = main.RouteOptimization()
+        cities, _, roads, _ = optimizer.parse_input(self.write('input.txt', text + '\n[REQUESTS]'))
+        indptr, indices, weights = roads
+        n = len(cities)
+
+        for crit in optimizer._WEIGHTS:
+            idx = optimizer.lex_weight_idx(roads, (crit,))
+            row = weights[idx]
+
+            # Вес дороги между парой городов: из параллельных - самая легкая
+            edge = {}
+            for u in range(n):
+                for k in range(indptr[u], indptr[u + 1]):
+                    pair = (u, indices[k])
+                    edge[pair] = min(edge.get(pair, main.INF), row[k])
+
+            landmarks = optimizer.build_landmarks(roads, idx)
+            hierarchy = optimizer.build_hierarchy(roads, idx)
+            self.assertIsNotNone(hierarchy)
+
+            for start in range(n):
+                _, distance = optimizer._sssp(roads, start, idx)
+                for end in range(n):
+                    expected = None if distance[end] == main.INF else distance[end]
+
+                    optimizer._landmarks.clear()
+                    optimizer._hierarchies.clear()
+                    results = {'bidirectional': optimizer._bidirectional(roads, start, end, idx)}
+                    optimizer._landmarks[idx] = landmarks
+                    results['alt'] = optimizer._bidirectional(roads, start, end, idx)
+                    optimizer._hierarchies[idx] = hierarchy
+                    results['ch'] = optimizer._hierarchy_query(start, end, idx)
+
+                    for name, (route, cost) in results.items():
+                        with self.subTest(crit=crit, start=start, end=end, search=name):
+                            self.assertEqual(cost, expected)
+                            if route is not None:
+                                self.assertEqual((route[0], route[-1]), (start, end))
+                                self.assertEqual(sum(map(edge.__getitem__, zip(route, route[1:]))), cost)
+
+    def test_random_graph(self):
+        for seed in range(3):
+            self.check_searches(random_graph(seed))
+
+    def test_grid_graph(self):
+        self.check_searches(grid_graph(0))
+
+    def test_calculate_with_forced_preprocessing(self):
+        # Разовые запросы ищутся двунаправленным поиском, по ориентирам
+        # или по иерархии сжатия в зависимости от порогов;
+        # вывод во всех случаях должен совпадать
+        rnd = random.Random(1)
+        requests = [
+            f'Узел {rnd.randrange(64)} -> Узел {rnd.randrange(64)} | ({",".join(rnd.sample("ДВС", 3))})'
+            for _ in range(40)
+        ]
+        input_path = self.write('input.txt', grid_graph(1) + '\n[REQUESTS]\n' + '\n'.join(requests))
+
+        outputs = []
+        never = len(requests) + 1
+        for limits in ({'LANDMARK_MIN_QUERIES': never, 'HIERARCHY_MIN_QUERIES': never},
+                       {'LANDMARK_MIN_QUERIES': 1, 'HIERARCHY_MIN_QUERIES': never},
+                       {'LANDMARK_MIN_QUERIES': 1, 'HIERARCHY_MIN_QUERIES': 1}):
+            output_path = os.path.join(self.tmp.name, f'output{len(outputs)}.txt')
+            with mock.patch.multiple(main, **limits):
+                main.RouteOptimization().calculate(input_path, output_path)
+            with open(output_path, encoding='utf-8') as f:
+                outputs.append([line.split(' | ')[-1] for line in f.read().split('\n')])
+
+        self.assertEqual(len(outputs[0]), 4 * len(requests))
+        self.assertEqual(outputs[1], outputs[0])
+        self.assertEqual(outputs[2], outputs[0])
+
+
+# Три пути из A в B:
+# через X - (Д=10, В=2, С=9), через Y - (10, 6, 5), через Z - (20, 6, 2)
+THREE_PATHS = '''[CITIES]
+1: A
+2: B
+3: X
+4: Y
+5: Z
+[ROADS]
+1 - 3: 5, 1, 5
+3 - 2: 5, 1, 4
+1 - 4: 5, 3, 3
+4 - 2: 5, 3, 2
+1 - 5: 10, 3, 1
+5 - 2: 10, 3, 1
+[REQUESTS]
+'''
+
+
+class CompromiseTest(TempDirTest):
+    """
+    Компромиссный маршрут - лексикографический оптимум по всем путям
+    """
+
+    def test_lexicographic_optimum(self):
+        # По длине равны пути через X и через Y; из оптимальных по одному
+        # критерию лучший для (Д,С,В) - через X, но через Y дешевле
+        self.assertEqual(self.calculate(THREE_PATHS + 'A -> B | (Д,С,В)'), [
+            'ДЛИНА: A -> X -> B | Д=10, В=2, С=9',
+            'ВРЕМЯ: A -> X -> B | Д=10, В=2, С=9',
+            'СТОИМОСТЬ: A -> Z -> B | Д=20, В=6, С=2',
+            'КОМПРОМИСС: A -> Y -> B | Д=10, В=6, С=5',
+        ])
+
+
+class OutputTest(TempDirTest):
+    """
+    Состав и порядок вывода
+    """
+
+    def test_duplicate_requests(self):
+        # Повторяющиеся запросы решаются один раз, но выводятся
+        # при каждом вхождении в исходном порядке
+        requests = ['A -> B | (Д,С,В)', 'X -> Z | (В,Д,С)', 'A -> B | (Д,С,В)',
+                    'A -> Y | (С,В,Д)', 'X -> Z | (В,Д,С)', 'A -> B | (Д,С,В)']
+        blocks = {request: self.calculate(THREE_PATHS + request) for request in set(requests)}
+
+        expected = [line for request in requests for line in blocks[request]]
+        self.assertEqual(len(expected), 4 * len(requests))
+        self.assertEqual(self.calculate(THREE_PATHS + '\n'.join(requests)), expected)
+
+    def test_invalid_input_writes_nothing(self):
+        # При ошибке во входных данных выходной файл не создается
+        cases = {
+            'unknown_city': THREE_PATHS + 'A -> Q | (Д,В,С)',
+            'unknown_priority': THREE_PATHS + 'A -> B | (Д,Х,С)',
+            'unknown_road_city': '[CITIES]\n1: A\n2: B\n[ROADS]\n1 - 3: 1, 1, 1\n3 - 2: 1, 1, 1\n'
+                                 '[REQUESTS]\nA -> B | (Д,В,С)',
+            'bad_road': THREE_PATHS.replace('5 - 2: 10, 3, 1', '5 - 2: 10, 3') + 'A -> B | (Д,В,С)',
+            'bad_request': THREE_PATHS + 'A - B (Д,В,С)',
+        }
+        for name, text in cases.items():
+            with self.subTest(name):
+                self.assertIsNone(self.calculate(text))
+
+
+if __name__ == '__main__':
+    unittest.main()